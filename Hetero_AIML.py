@@ -1,103 +1,221 @@
-import random
 from collections import defaultdict
+import numpy as np
+
+try:
+    from numba import njit, types
+    from numba.typed import Dict
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+try:
+    from pydivsufsort import divsufsort, kasai
+    _SUFSORT_AVAILABLE = True
+except ImportError:
+    _SUFSORT_AVAILABLE = False
+
+# Longest possible heterorepeat: one of each of the 20 standard amino acids
+MAX_HET = 20
+
+# Shortest sequence sent to the suffix-array scan when numba is also available; below this the
+# compiled scan is faster, since building the suffix array dominates on short sequences
+SA_MIN_LENGTH = 600
+
+# Base for packing a window into an int key, one digit per Unicode code point
+KEY_BASE = 0x110000
+
+# Standard amino acids in the order used for their compact 0-19 codes
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+# Amino acids as raw bytes, and the generator used to draw random sequences from them
+_AA_BYTES = np.frombuffer(AMINO_ACIDS.encode(), dtype=np.uint8)
+_RNG = np.random.default_rng()
+
+# Byte -> amino acid code lookup table, 255 for anything outside the standard alphabet; codes are
+# uint8 so both the suffix-array and compiled scans can use the encoded array without a copy
+_AA_INDEX = np.full(256, 255, dtype=np.uint8)
+_AA_INDEX[_AA_BYTES] = np.arange(len(AMINO_ACIDS))
+
+# Amino acid code -> its bit in a window mask, built once here rather than shifted on every step
+_AA_BIT = np.left_shift(np.int64(1), np.arange(len(AMINO_ACIDS), dtype=np.int64))
+
+# Encode a sequence as amino acid codes, or None if it has residues outside the standard 20
+def _encode(sequence):
+    if not sequence.isascii():
+        return None
+    codes = _AA_INDEX[np.frombuffer(sequence.encode(), dtype=np.uint8)]
+    if (codes == 255).any():
+        return None
+    return codes
+
+if _NUMBA_AVAILABLE:
+    # A window is keyed exactly by its codes packed 5 bits each: the first 12 residues
+    # in the first int, the rest (up to MAX_HET - 12) in the second
+    _KEY_TYPE = types.UniTuple(types.int64, 2)
+    _SPAN_TYPE = types.UniTuple(types.int64, 2)
+
+    # Compiled heterorepeat scan over encoded residues, returning (starts, lengths, counts)
+    # of the windows that occur more than once; releases the GIL so threads can run it in parallel
+    @njit(cache=True, nogil=True)
+    def _scan_repeats(codes, bits, max_len):
+        n = codes.shape[0]
+        counts = Dict.empty(key_type=_KEY_TYPE, value_type=types.int64)
+        spans = Dict.empty(key_type=_KEY_TYPE, value_type=_SPAN_TYPE)
+
+        # Two-pointer sweep: [i, end) is the longest window from i with no repeated amino acid
+        # (capped at max_len); end never moves back, so the uniqueness tests cost O(n) overall
+        # and every window enumerated below is known to be hetero without testing it
+        end = 0
+        mask = np.int64(0)
+        for i in range(n - 1):
+            while end < n and end - i < max_len and not (mask & bits[codes[end]]):
+                mask |= bits[codes[end]]
+                end += 1
+
+            hi = codes[i] + 1
+            lo = np.int64(0)
+            for j in range(i + 1, end):
+                if j - i < 12:
+                    hi = (hi << 5) | (codes[j] + 1)
+                else:
+                    lo = (lo << 5) | (codes[j] + 1)
+                key = (hi, lo)
+                count = counts.get(key, 0)
+                if count == 0:
+                    spans[key] = (i, j + 1 - i)
+                counts[key] = count + 1
+
+            # Drop residue i from the window; it occurs there only once, so clearing its bit is exact
+            mask ^= bits[codes[i]]
+
+        size = 0
+        for count in counts.values():
+            if count > 1:
+                size += 1
+        starts = np.empty(size, dtype=np.int64)
+        lengths = np.empty(size, dtype=np.int64)
+        repeat_counts = np.empty(size, dtype=np.int64)
+        k = 0
+        for key, count in counts.items():
+            if count > 1:
+                starts[k], lengths[k] = spans[key]
+                repeat_counts[k] = count
+                k += 1
+        return starts, lengths, repeat_counts
+
+    # Compile once at import so the first real sequence doesn't pay for it
+    _scan_repeats(_encode(AMINO_ACIDS), _AA_BIT, MAX_HET)
+
+# Suffix-array heterorepeat scan over encoded residues, returning (starts, lengths, counts) of the
+# windows that occur more than once. Suffixes sharing their first L residues sit next to each other
+# in the suffix array, so every repeat of length L is a run of LCP >= L and all counting is vectorised
+def _scan_repeats_sa(codes, max_len):
+    n = codes.shape[0]
+    if n < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    sa = divsufsort(codes).astype(np.int64)
+    lcp = kasai(codes, sa)  # lcp[k] is the common prefix length of suffixes sa[k] and sa[k + 1]
+
+    # Longest window from each position with no repeated amino acid: it ends at the nearest
+    # next occurrence of any residue at or after that position
+    order = np.lexsort((np.arange(n), codes))
+    next_same = np.full(n, n, dtype=np.int64)
+    same = codes[order[1:]] == codes[order[:-1]]
+    next_same[order[:-1][same]] = order[1:][same]
+    hetero_len = (np.minimum.accumulate(next_same[::-1])[::-1] - np.arange(n))[sa]
+
+    starts, lengths, counts = [], [], []
+    for length in range(2, max_len + 1):
+        # A new group of identical length-L prefixes starts wherever the LCP drops below L
+        new_group = np.ones(n, dtype=bool)
+        new_group[1:] = lcp[:-1] < length
+        bounds = np.flatnonzero(new_group)
+        sizes = np.diff(np.append(bounds, n))
+        keep = (sizes > 1) & (hetero_len[bounds] >= length)
+
+        # Every prefix of a heterorepeat is itself a heterorepeat, so none are left once a length has none
+        if not keep.any():
+            break
+        starts.append(np.minimum.reduceat(sa, bounds)[keep])  # First occurrence of each repeat
+        lengths.append(np.full(np.count_nonzero(keep), length, dtype=np.int64))
+        counts.append(sizes[keep])
+
+    if not starts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(starts), np.concatenate(lengths), np.concatenate(counts)
 
 # Function to generate a random protein sequence of given length
 def generate_protein_sequence(length):
-    amino_acids = "ACDEFGHIKLMNPQRSTVWY"  # 20 standard amino acids
-    return ''.join(random.choices(amino_acids, k=length))
+    return _RNG.choice(_AA_BYTES, size=length).tobytes().decode('ascii')
 
-# Function to fragment the protein sequence into chunks of max length 1000
-def fragment_protein_sequence(sequence, max_length=1000):
-    return [sequence[i:i+max_length] for i in range(0, len(sequence), max_length)]
+# Pure-Python heterorepeat scan, returning (start, length, count) of the windows that occur more than once
+def _scan_repeats_py(sequence, max_len):
+    n = len(sequence)
+    repeat_counts = defaultdict(int)
+    spans = {}  # First (start, length) of each packed key, to rebuild kept substrings
+
+    # One bit per residue so the amino acids in a window fit in a single int mask
+    codes = [ord(aa) for aa in sequence]
+    bits = [1 << c for c in codes]
+
+    # Two-pointer sweep: [i, end) is the longest window from i with no repeated amino acid, capped at
+    # max_len; end never moves back, so the uniqueness tests cost O(n) overall
+    end = 0
+    mask = 0
+    for i in range(n - 1):
+        while end < n and end - i < max_len and not mask & bits[end]:
+            mask |= bits[end]
+            end += 1
+
+        key = codes[i]
+        for j in range(i + 1, end):
+            # Extend the window's packed key by one residue instead of slicing and hashing a new string
+            key = key * KEY_BASE + codes[j]
+            repeat_counts[key] += 1
+            if key not in spans:
+                spans[key] = (i, j + 1 - i)
+
+        # Drop residue i from the window; it occurs there only once, so clearing its bit is exact
+        mask ^= bits[i]
+
+    # Filter out repeats with frequency 1
+    return [(start, length, repeat_counts[key]) for key, (start, length) in spans.items() if repeat_counts[key] > 1]
+
+# Whether a standard-alphabet sequence of this length goes to the compiled scan; unlike the
+# suffix-array and pure-Python scans it releases the GIL, so only these gain from running in threads
+def uses_compiled_scan(length):
+    return _NUMBA_AVAILABLE and (not _SUFSORT_AVAILABLE or length < SA_MIN_LENGTH)
 
 # Function to find repeating amino acid sequences
 def find_hetero_amino_acid_repeats(sequence):
-    repeat_counts = defaultdict(int)
-
-    # Iterate over all possible substring lengths
-    for length in range(2, len(sequence) + 1):
-        for i in range(len(sequence) - length + 1):
-            substring = sequence[i:i+length]
-            repeat_counts[substring] += 1
-
-    # Filter out substrings that occur only once
-    return {k: v for k, v in repeat_counts.items() if v > 1}
-
-# Function to check and update repeats at boundaries
-def check_boundary_repeats(fragments, final_repeats, overlap=50):
-    """
-    Check for repeating substrings that span across fragment boundaries
-    and update the final repeats dictionary accordingly.
-    
-    Ensures that repeats are truly spanning both fragments.
-    """
-    for i in range(len(fragments) - 1):
-        left_overlap = fragments[i][-overlap:] if len(fragments[i]) >= overlap else fragments[i]
-        right_overlap = fragments[i + 1][:overlap] if len(fragments[i + 1]) >= overlap else fragments[i + 1]
-        overlap_region = left_overlap + right_overlap  # Join both
-        
-        boundary_repeats = find_hetero_amino_acid_repeats(overlap_region)
-
-        for substring, count in boundary_repeats.items():
-            # Ensure substring spans across both fragments
-            if any(aa in left_overlap for aa in substring) and any(aa in right_overlap for aa in substring):
-                final_repeats[substring] += count  # Only add if spanning both fragments
-
-    return final_repeats
-
-# Function to find new repeats that only appear at fragmentation points
-def find_new_boundary_repeats(fragments, final_repeats, overlap=50):
-    """
-    Identify new repeats that appear only at fragmentation boundaries
-    and update the final dictionary accordingly.
-    
-    Ensures that:
-    - The detected repeat spans across two fragments.
-    - It is *not* already counted from individual fragments.
-    """
-    new_repeats = defaultdict(int)
-
-    for i in range(len(fragments) - 1):
-        left_overlap = fragments[i][-overlap:] if len(fragments[i]) >= overlap else fragments[i]
-        right_overlap = fragments[i + 1][:overlap] if len(fragments[i + 1]) >= overlap else fragments[i + 1]
-        overlap_region = left_overlap + right_overlap  # Join both
-        
-        boundary_repeats = find_hetero_amino_acid_repeats(overlap_region)
-
-        for substring, count in boundary_repeats.items():
-            # Ensure substring spans across both fragments
-            if any(aa in left_overlap for aa in substring) and any(aa in right_overlap for aa in substring):
-                # Only add if it's a *new* repeat (not already in final dictionary)
-                if substring not in final_repeats:
-                    new_repeats[substring] += count  
-
-    return new_repeats
+    # Sequences over the standard alphabet go through the compiled scan when numba is installed,
+    # switching to the suffix-array scan from SA_MIN_LENGTH residues (or always, without numba)
+    # when pydivsufsort is; anything else uses the pure-Python scan
+    encoded = _encode(sequence) if _SUFSORT_AVAILABLE or _NUMBA_AVAILABLE else None
+    if encoded is not None:
+        if uses_compiled_scan(len(encoded)):
+            starts, lengths, counts = _scan_repeats(encoded, _AA_BIT, MAX_HET)
+        else:
+            starts, lengths, counts = _scan_repeats_sa(encoded, MAX_HET)
+        found = zip(starts.tolist(), lengths.tolist(), counts.tolist())
+    else:
+        # Non-standard residues can push a window past MAX_HET, but by pigeonhole no window with
+        # all-unique residues is longer than the number of distinct characters in the sequence
+        found = _scan_repeats_py(sequence, len(set(sequence)))
+
+    # All scans only report windows that occur more than once
+    return {sequence[start:start + length]: count for start, length, count in found}
 
 # Main function to process the protein sequence
-def process_protein_sequence(sequence, overlap=50):
-    fragments = fragment_protein_sequence(sequence)
-    
-    # Step 1: Find repeats in each fragment
-    final_repeats = defaultdict(int)
-    for fragment in fragments:
-        fragment_repeats = find_hetero_amino_acid_repeats(fragment)
-        for k, v in fragment_repeats.items():
-            final_repeats[k] += v
-
-    # Step 2: Check and update repeats at boundaries
-    final_repeats = check_boundary_repeats(fragments, final_repeats, overlap)
-
-    # Step 3: Find new repeats emerging at boundaries
-    new_repeats = find_new_boundary_repeats(fragments, final_repeats, overlap)
-
-    # Step 4: Merge new repeats into final dictionary
-    for k, v in new_repeats.items():
-        final_repeats[k] += v
-
-    return final_repeats
+def process_protein_sequence(sequence):
+    # Heterorepeats are at most MAX_HET residues long, so a single scan over the whole
+    # sequence is exact; no fragmenting or boundary stitching is needed
+    return find_hetero_amino_acid_repeats(sequence)
 
 # Example usage
-if _name_ == "_main_":
+if __name__ == "__main__":
     sequence_length = 12030  # Example length
     protein_sequence = generate_protein_sequence(sequence_length)
     
@@ -5,13 +5,18 @@ import xlsxwriter
 from io import BytesIO
 from collections import defaultdict
 
+# Translation table that strips quotes and spaces from sequences read from Excel
+_CLEAN = str.maketrans('', '', '" ')
+
 # Function to find heterorepeats in the protein sequence
 def find_heterorepeats(protein):
     n = len(protein)
     freq = defaultdict(int)
 
-    # Iterate through all possible lengths of substrings (2 to N)
-    for length in range(2, n + 1):
+    # Iterate through substring lengths 2 up to the number of distinct residues; a substring with
+    # all-unique amino acids can't be longer (pigeonhole), so longer ones never qualify. That is at
+    # most 20 for the standard alphabet, without dropping longer repeats over non-standard residues
+    for length in range(2, len(set(protein)) + 1):
         # Use a sliding window to find substrings of this length
         for i in range(n - length + 1):
             substring = protein[i:i + length]
@@ -28,15 +33,19 @@ def process_excel(excel_data):
     sequence_data = []
 
     for sheet_name in excel_data.sheet_names:
-        df = excel_data.parse(sheet_name)
-        if len(df.columns) < 3:
+        # Only read the ID, Protein Name and Sequence columns; pandas rejects them if the sheet is narrower,
+        # but an empty sheet parses to a frame with no columns at all, so check the width as well
+        try:
+            df = excel_data.parse(sheet_name, usecols=[0, 1, 2])
+        except pd.errors.ParserError:
+            df = None
+        if df is None or len(df.columns) < 3:
             st.error(f"Error: The sheet '{sheet_name}' must have at least three columns: ID, Protein Name, Sequence")
             return None, None
 
-        for _, row in df.iterrows():
-            entry_id = str(row[0])
-            protein_name = str(row[1])
-            sequence = str(row[2]).replace('"', '').replace(' ', '')
+        # Clean the whole sequence column at once, then walk the columns together instead of iterrows
+        sequences = df.iloc[:, 2].astype(str).str.translate(_CLEAN)
+        for entry_id, protein_name, sequence in zip(df.iloc[:, 0].astype(str), df.iloc[:, 1].astype(str), sequences):
             freq = find_heterorepeats(sequence)
             sequence_data.append((entry_id, protein_name, freq))
             heterorepeats.update(freq.keys())  # Collect unique heterorepeats
@@ -46,7 +55,13 @@ def process_excel(excel_data):
 # Function to generate and download Excel workbook with separate sheets for each input file
 def create_excel(sequences_data, heterorepeats, filenames):
     output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    # Flush each row as it is written instead of holding the whole sheet in memory;
+    # xlsxwriter ignores constant_memory when in_memory is set, so that option is dropped
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+
+    # Sort the repeat columns once and map each repeat to its column offset
+    repeats_sorted = sorted(heterorepeats)
+    repeat_idx = {repeat: i for i, repeat in enumerate(repeats_sorted)}
 
     # Iterate through sequences data grouped by filenames and create separate sheets
     for file_index, file_data in enumerate(sequences_data):
@@ -54,22 +69,18 @@ def create_excel(sequences_data, heterorepeats, filenames):
         worksheet = workbook.add_worksheet(filename[:31])  # Limit sheet name to 31 characters
 
         # Write the header for the current file
-        worksheet.write(0, 0, "Entry ID")
-        worksheet.write(0, 1, "Protein Name")
-        col = 2
-        for repeat in sorted(heterorepeats):
-            worksheet.write(0, col, repeat)
-            col += 1
+        worksheet.write_row(0, 0, ["Entry ID", "Protein Name", *repeats_sorted])
 
         # Write data for each sequence in the current file
         row = 1
         for entry_id, protein_name, freq in file_data:
-            worksheet.write(row, 0, entry_id)
-            worksheet.write(row, 1, protein_name)
-            col = 2
-            for repeat in sorted(heterorepeats):
-                worksheet.write(row, col, freq.get(repeat, 0))
-                col += 1
+            # Fill a dense row from the sequence's own repeats instead of looking up every column
+            vals = [0] * len(repeats_sorted)
+            for repeat, count in freq.items():
+                j = repeat_idx.get(repeat)
+                if j is not None:
+                    vals[j] = count
+            worksheet.write_row(row, 0, [entry_id, protein_name, *vals])
             row += 1
 
     workbook.close()
@@ -89,7 +100,7 @@ if uploaded_files:
     filenames = []
 
     for file in uploaded_files:
-        excel_data = pd.ExcelFile(file)
+        excel_data = pd.ExcelFile(file, engine='calamine')
         heterorepeats, sequence_data = process_excel(excel_data)
         if heterorepeats is not None:
             all_heterorepeats.update(heterorepeats)
@@ -114,11 +125,12 @@ if uploaded_files:
         if st.checkbox("Show Results Table"):
             # Convert the sequences data into a DataFrame for easy display
             rows = []
+            repeats_sorted = sorted(all_heterorepeats)
             for file_index, file_data in enumerate(all_sequences_data):
                 filename = filenames[file_index]
                 for entry_id, protein_name, freq in file_data:
                     row = {"Filename": filename, "Entry ID": entry_id, "Protein Name": protein_name}
-                    row.update({repeat: freq.get(repeat, 0) for repeat in sorted(all_heterorepeats)})
+                    row.update({repeat: freq.get(repeat, 0) for repeat in repeats_sorted})
                     rows.append(row)
 
             result_df = pd.DataFrame(rows)
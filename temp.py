@@ -1,130 +1,113 @@
-import random
+import os
 import xlsxwriter
 from io import BytesIO
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import streamlit as st
 import pandas as pd
 
-# Function to generate a random protein sequence of given length
-def generate_protein_sequence(length):
-    amino_acids = "ACDEFGHIKLMNPQRSTVWY"  # 20 standard amino acids
-    return ''.join(random.choices(amino_acids, k=length))
-
-# Function to fragment the protein sequence into chunks of max length 1000
-def fragment_protein_sequence(sequence, max_length=1000):
-    return [sequence[i:i+max_length] for i in range(0, len(sequence), max_length)]
-
-# Function to find heterorepeats in the protein sequence
-def find_hetero_amino_acid_repeats(sequence):
-    n = len(sequence)
-    freq = defaultdict(int)
-
-    # Iterate through all possible lengths of substrings (2 to N)
-    for length in range(2, n + 1):
-        # Use a sliding window to find substrings of this length
-        for i in range(n - length + 1):
-            substring = sequence[i:i + length]
-
-            # Check if all amino acids in the substring are different
-            if len(set(substring)) == len(substring):  # All amino acids are unique
-                freq[substring] += 1
-
-    # Filter out repeats with frequency 1 or length 1
-    return {repeat: count for repeat, count in freq.items() if len(repeat) > 1 and count > 1}
-
-# Function to check and update repeats at boundaries
-def check_boundary_repeats(fragments, final_repeats, overlap=50):
-    """
-    Check for repeating substrings that span across fragment boundaries
-    and update the final repeats dictionary accordingly.
-    
-    Ensures that repeats are truly spanning both fragments.
-    """
-    for i in range(len(fragments) - 1):
-        left_overlap = fragments[i][-overlap:] if len(fragments[i]) >= overlap else fragments[i]
-        right_overlap = fragments[i + 1][:overlap] if len(fragments[i + 1]) >= overlap else fragments[i + 1]
-        overlap_region = left_overlap + right_overlap  # Join both
-        
-        boundary_repeats = find_hetero_amino_acid_repeats(overlap_region)
-
-        for substring, count in boundary_repeats.items():
-            # Ensure substring spans across both fragments
-            if any(aa in left_overlap for aa in substring) and any(aa in right_overlap for aa in substring):
-                final_repeats[substring] += count  # Only add if spanning both fragments
-
-    return final_repeats
-
-# Function to process the protein sequence and return final heterorepeats
-def process_protein_sequence(sequence, overlap=50):
-    fragments = fragment_protein_sequence(sequence)
-    
-    # Step 1: Find repeats in each fragment
-    final_repeats = defaultdict(int)
-    for fragment in fragments:
-        fragment_repeats = find_hetero_amino_acid_repeats(fragment)
-        for k, v in fragment_repeats.items():
-            final_repeats[k] += v
-
-    # Step 2: Check and update repeats at boundaries
-    final_repeats = check_boundary_repeats(fragments, final_repeats, overlap)
-
-    return final_repeats
+from Hetero_AIML import find_hetero_amino_acid_repeats, uses_compiled_scan
+
+# Translation table that strips quotes and spaces from sequences read from Excel
+_CLEAN = str.maketrans('', '', '" ')
+
+# Cached heterorepeat scan, so sequences repeated across rows, sheets, uploads or Streamlit reruns are
+# only scanned once; st.cache_data keeps the cache across reruns and hands each caller its own copy
+@st.cache_data(max_entries=4096, show_spinner=False)
+def _find_repeats_cached(sequence):
+    return find_hetero_amino_acid_repeats(sequence)
 
 # Function to process a single Excel sheet and return its analysis
 def process_excel(excel_data):
     sequence_data = []
-    all_heterorepeats = defaultdict(int)  # Track all heterorepeats and their counts
+    all_heterorepeats = Counter()  # Track all heterorepeats and their counts
+    rows = []  # (entry_id, protein_name, sequence) from every sheet, scanned together below
 
     for sheet_name in excel_data.sheet_names:
-        df = excel_data.parse(sheet_name)
-        if len(df.columns) < 3:
+        # Only read the ID, Protein Name and Sequence columns; pandas rejects them if the sheet is narrower,
+        # but an empty sheet parses to a frame with no columns at all, so check the width as well
+        try:
+            df = excel_data.parse(sheet_name, usecols=[0, 1, 2])
+        except pd.errors.ParserError:
+            df = None
+        if df is None or len(df.columns) < 3:
             st.error(f"Error: The sheet '{sheet_name}' must have at least three columns: ID, Protein Name, Sequence")
             return None, None
 
-        for _, row in df.iterrows():
-            entry_id = str(row[0])
-            protein_name = str(row[1])
-            sequence = str(row[2]).replace('"', '').replace(' ', '')
-            freq = find_hetero_amino_acid_repeats(sequence)  # Returns a dictionary with repeats and their counts
-            sequence_data.append((entry_id, protein_name, freq))
+        # Clean the whole sequence column at once instead of row by row
+        sequences = df.iloc[:, 2].astype(str).str.translate(_CLEAN)
+        rows.extend(zip(df.iloc[:, 0].astype(str), df.iloc[:, 1].astype(str), sequences))
+
+    # Scan each distinct sequence once. Only the compiled scan releases the GIL, so only sequences headed
+    # for it are spread over threads, and only with more than one core; the suffix-array and pure-Python
+    # scans hold the GIL and would just contend for it in threads, so they run serially
+    sequences = list(dict.fromkeys(sequence for _, _, sequence in rows))
+    found = {}
+    if (os.cpu_count() or 1) > 1:
+        threaded = [sequence for sequence in sequences if uses_compiled_scan(len(sequence))]
+        with ThreadPoolExecutor() as executor:
+            found.update(zip(threaded, executor.map(_find_repeats_cached, threaded)))
+    for sequence in sequences:
+        if sequence not in found:
+            found[sequence] = _find_repeats_cached(sequence)
+
+    # Rows with the same sequence share one repeat dict rather than each copying it
+    for entry_id, protein_name, sequence in rows:
+        freq = found[sequence]
+        sequence_data.append((entry_id, protein_name, freq))
+
+        # Update the main heterorepeats dictionary with counts
+        all_heterorepeats.update(freq)
+
+    return all_heterorepeats, sequence_data
+
+# Function to pack every sequence's repeat counts into one dense matrix, one row per sequence
+def build_count_matrix(sequences_data, heterorepeats):
+    # Filter out repeats with frequency 1 or length 1, and give each remaining repeat a column
+    repeats_sorted = sorted(repeat for repeat, count in heterorepeats.items() if len(repeat) > 1 and count > 1)
+    repeat_to_col = {repeat: i for i, repeat in enumerate(repeats_sorted)}
+
+    n_rows = sum(len(file_data) for file_data in sequences_data)
+    counts = np.zeros((n_rows, len(repeats_sorted)), dtype=np.int32)
+    entry_ids = []
+    protein_names = []
+    file_rows = []  # (start, stop) range of matrix rows belonging to each file
+
+    row = 0
+    for file_data in sequences_data:
+        start = row
+        for entry_id, protein_name, freq in file_data:
+            entry_ids.append(entry_id)
+            protein_names.append(protein_name)
 
-            # Update the main heterorepeats dictionary with counts
+            # Fill the row straight from the repeats process_excel already found in this sequence
             for repeat, count in freq.items():
-                all_heterorepeats[repeat] += count
+                j = repeat_to_col.get(repeat)
+                if j is not None:
+                    counts[row, j] = count
+            row += 1
+        file_rows.append((start, row))
 
-    return all_heterorepeats, sequence_data
+    return repeats_sorted, entry_ids, protein_names, file_rows, counts
 
 # Function to generate and download Excel workbook with separate sheets for each input file
-def create_excel(sequences_data, heterorepeats, filenames):
+def create_excel(repeats_sorted, entry_ids, protein_names, file_rows, counts, filenames):
     output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-
-    # Filter out repeats with frequency 1 or length 1
-    valid_heterorepeats = {repeat: count for repeat, count in heterorepeats.items() if len(repeat) > 1 and count > 1}
+    # Flush each row as it is written instead of holding the whole sheet in memory;
+    # xlsxwriter ignores constant_memory when in_memory is set, so that option is dropped
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
 
-    # Iterate through sequences data grouped by filenames and create separate sheets
-    for file_index, file_data in enumerate(sequences_data):
-        filename = filenames[file_index]
+    # Iterate through the matrix rows grouped by filenames and create separate sheets
+    for (start, stop), filename in zip(file_rows, filenames):
         worksheet = workbook.add_worksheet(filename[:31])  # Limit sheet name to 31 characters
 
         # Write the header for the current file
-        worksheet.write(0, 0, "Entry ID")
-        worksheet.write(0, 1, "Protein Name")
-        col = 2
-        for repeat in sorted(valid_heterorepeats):
-            worksheet.write(0, col, repeat)
-            col += 1
+        worksheet.write_row(0, 0, ["Entry ID", "Protein Name", *repeats_sorted])
 
         # Write data for each sequence in the current file
-        row = 1
-        for entry_id, protein_name, freq in file_data:
-            worksheet.write(row, 0, entry_id)
-            worksheet.write(row, 1, protein_name)
-            col = 2
-            for repeat in sorted(valid_heterorepeats):
-                worksheet.write(row, col, freq.get(repeat, 0))
-                col += 1
-            row += 1
+        for row, i in enumerate(range(start, stop), start=1):
+            worksheet.write_row(row, 0, [entry_ids[i], protein_names[i], *counts[i].tolist()])
 
     workbook.close()
     output.seek(0)
@@ -138,12 +121,12 @@ uploaded_files = st.file_uploader("Upload Excel files", accept_multiple_files=Tr
 
 # Step 2: Process files and display results
 if uploaded_files:
-    all_heterorepeats = defaultdict(int)
+    all_heterorepeats = Counter()
     all_sequences_data = []
     filenames = []
 
     for file in uploaded_files:
-        excel_data = pd.ExcelFile(file)
+        excel_data = pd.ExcelFile(file, engine='calamine')
         heterorepeats, sequence_data = process_excel(excel_data)
         if heterorepeats is not None:
             all_heterorepeats.update(heterorepeats)
@@ -153,8 +136,9 @@ if uploaded_files:
     if all_sequences_data:
         st.success(f"Processed {len(uploaded_files)} files successfully!")
 
-        # Step 3: Generate and download the Excel report
-        excel_file = create_excel(all_sequences_data, all_heterorepeats, filenames)
+        # Step 3: Pack the counts into a dense matrix and generate the Excel report
+        repeats_sorted, entry_ids, protein_names, file_rows, counts = build_count_matrix(all_sequences_data, all_heterorepeats)
+        excel_file = create_excel(repeats_sorted, entry_ids, protein_names, file_rows, counts, filenames)
 
         # Download the Excel file
         st.download_button(
@@ -166,14 +150,10 @@ if uploaded_files:
 
         # Step 4: Display summary table
         if st.checkbox("Show Results Table"):
-            # Convert the sequences data into a DataFrame for easy display
-            rows = []
-            for file_index, file_data in enumerate(all_sequences_data):
-                filename = filenames[file_index]
-                for entry_id, protein_name, freq in file_data:
-                    row = {"Filename": filename, "Entry ID": entry_id, "Protein Name": protein_name}
-                    row.update({repeat: freq.get(repeat, 0) for repeat in sorted(all_heterorepeats)})
-                    rows.append(row)
-
-            result_df = pd.DataFrame(rows)
+            # Wrap the count matrix in a DataFrame as-is and prepend the row labels, instead of
+            # copying every cell into a per-row dict first
+            result_df = pd.DataFrame(counts, columns=repeats_sorted)
+            result_df.insert(0, "Protein Name", protein_names)
+            result_df.insert(0, "Entry ID", entry_ids)
+            result_df.insert(0, "Filename", [filename for (start, stop), filename in zip(file_rows, filenames) for _ in range(start, stop)])
             st.dataframe(result_df)